@@ -1,8 +1,13 @@
 import os
 import re
 import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from itertools import repeat
+import mmap
+import multiprocessing
 import sys
+import tempfile
 
 # Detect color support
 SUPPORTS_COLOR = sys.stdout.isatty()
@@ -10,142 +15,218 @@ RED = "\033[91m" if SUPPORTS_COLOR else ""
 GREEN = "\033[92m" if SUPPORTS_COLOR else ""
 RESET = "\033[0m" if SUPPORTS_COLOR else ""
 
-# Auto-exclusion patterns
-AUTO_EXCLUDE_PATTERNS = [
-    re.compile(r'^\[.*IB\]$', re.IGNORECASE),  # Skip any section ending with IB
-    re.compile(r'^\[(CommandList|TextureOverride).*Position\]$', re.IGNORECASE),
-    re.compile(r'^\[(CommandList|TextureOverride).*Texcoord\]$', re.IGNORECASE),
-    re.compile(r'^\[(CommandList|TextureOverride).*Blend\]$', re.IGNORECASE),
-    re.compile(r'^\[(CommandList|TextureOverride).*Info\]$', re.IGNORECASE),
-    re.compile(r'^\[(CommandList|TextureOverride).*VertexLimitRaise\]$', re.IGNORECASE),
+# Auto-exclusion pattern
+AUTO_EXCLUDE_PATTERN = re.compile(
+    rb'^\[(?:'
+    rb'[^\]]*IB'  # Skip any section ending with IB
+    rb'|(?:CommandList|TextureOverride)[^\]]*(?:Position|Texcoord|Blend|Info|VertexLimitRaise)'
     # Full list of CommandList exclusions
-    re.compile(r'^\[CommandListCreditInfo\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadA2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadA\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadB2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadB\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadC2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadC\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadD2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListLoadD\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListMenu\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom0D\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom0\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom1D\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom1\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom2D\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom3D\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom3\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom4D\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom4\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom5D\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListRandom5\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveA2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveA\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveB2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveB\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveC2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveC\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveD2\]$', re.IGNORECASE),
-    re.compile(r'^\[CommandListSaveD\]$', re.IGNORECASE),
-]
-
-# Patterns
-RUN_LINE_PATTERN = re.compile(r'\s*run\s*=\s*CommandList\\global\\ORFix\\(NNFix|ORFix)', re.IGNORECASE)
-
-rename_extra_ps = None  # global toggle
-
-
-def process_block_full(block, section_name, clean_only=False):
-    if not block:
-        return block, []
+    rb'|CommandList(?:CreditInfo|Load[A-D]2?|Menu|Random[0-5]D?|Save[A-D]2?)'
+    rb')\]$',
+    re.IGNORECASE,
+)
 
-    changes = []
-    new_block = []
-    last_ps_index = None
-    has_normal = any("NormalMap" in line for line in block)
+# Section headers that get processed
+SECTION_PREFIXES = (b"[CommandList", b"[TextureOverride")
 
-    for line in block:
-        stripped = line.lstrip()
+# Patterns (INI files are processed as bytes)
+RUN_LINE_PATTERN = re.compile(rb'\s*run\s*=\s*CommandList\\global\\ORFix\\(NNFix|ORFix)', re.IGNORECASE)
+PS_T0_ASSIGN_PATTERN = re.compile(rb'ps-t0\s*=')
+PS_T0_LINE_PATTERN = re.compile(rb'\s*ps-t0\s*=', re.IGNORECASE)
+PS_T_PATTERN = re.compile(rb'ps-t\d+')
 
-        if not clean_only and rename_extra_ps and re.match(r'ps-t0\s*=', stripped) and "Extra" in stripped and "Diffuse" in stripped:
-            new_line = line.replace("ps-t0", "ps-t1", 1)
-            changes.append(f"{section_name} → RENAMED: {stripped} -> {stripped.replace('ps-t0','ps-t1',1)}")
-        else:
-            new_line = line
+# Run lines inserted after the last ps-t line
+ORFIX_RUN_LINE = b"run = CommandList\\global\\ORFix\\ORFix\n"
+NNFIX_RUN_LINE = b"run = CommandList\\global\\ORFix\\NNFix\n"
 
-        new_block.append(new_line)
 
-        if re.match(r'ps-t\d+', stripped):
-            last_ps_index = len(new_block) - 1
+def to_text(value):
+    return value.decode('utf-8', 'replace')
 
-    temp_block = []
-    for line in new_block:
-        if RUN_LINE_PATTERN.match(line):
-            changes.append(f"{section_name} → REMOVED misplaced run: {line.strip()}")
-            continue
-        temp_block.append(line)
-    new_block = temp_block
 
-    if not clean_only and last_ps_index is not None:
-        correct_run = "run = CommandList\\global\\ORFix\\ORFix\n" if has_normal else "run = CommandList\\global\\ORFix\\NNFix\n"
-        if not (len(new_block) > last_ps_index + 1 and new_block[last_ps_index + 1].strip() == correct_run.strip()):
-            new_block.insert(last_ps_index + 1, correct_run)
-            changes.append(f"{section_name} → ADDED run line: {correct_run.strip()}")
+def is_run_line(stripped):
+    # Only lines starting with "run" can match, skip the regex for everything else
+    return stripped[:3].lower() == b"run" and RUN_LINE_PATTERN.match(stripped) is not None
 
-    return new_block, changes
 
+def block_has_ps_t0(block):
+    # Cheap prefix test first so the regex only runs on ps-t0 candidates
+    return any(stripped[:5].lower() == b"ps-t0" and PS_T0_LINE_PATTERN.match(stripped) for _, stripped in block)
 
-def process_ini_preview(file_path, exclude_sections):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
 
+def process_block_full(block, section_name, clean_only=False, rename_extra_ps=False, file_has_normal=True):
+    if not block:
+        return block, []
+
+    changes = []
+    new_block = []
+    last_ps_index = None
+    # Only scan the block when NormalMap appears somewhere in the file
+    has_normal = file_has_normal and any(b"NormalMap" in stripped for _, stripped in block)
+    match_ps_t0 = PS_T0_ASSIGN_PATTERN.match
+    match_ps_t = PS_T_PATTERN.match
+
+    for line, stripped in block:
+        if not clean_only and rename_extra_ps and match_ps_t0(stripped) and b"Extra" in stripped and b"Diffuse" in stripped:
+            new_line = line.replace(b"ps-t0", b"ps-t1", 1)
+            new_stripped = stripped.replace(b"ps-t0", b"ps-t1", 1)
+            changes.append(f"{to_text(section_name)} → RENAMED: {to_text(stripped)} -> {to_text(new_stripped)}")
+            new_block.append((new_line, new_stripped))
+        else:
+            new_block.append((line, stripped))
+
+        if stripped.startswith(b"ps-t") and match_ps_t(stripped):
+            last_ps_index = len(new_block) - 1
+
+    insert_index = None if clean_only else last_ps_index
+    if insert_index is not None:
+        correct_run = ORFIX_RUN_LINE if has_normal else NNFIX_RUN_LINE
+
+    # Drop existing run lines and emit the correct one after the last ps-t line in one pass
+    result = []
+    for i, (line, stripped) in enumerate(new_block):
+        if is_run_line(stripped):
+            changes.append(f"{to_text(section_name)} → REMOVED misplaced run: {to_text(stripped.rstrip())}")
+        else:
+            result.append(line)
+        if i == insert_index:
+            # Match the line ending of the ps-t line the run is placed after
+            eol = line[len(line.rstrip(b"\r\n")):]
+            if not eol:
+                # The ps-t line is the unterminated last line of the file, end it before adding the run
+                eol = b"\r\n" if new_block[0][0].endswith(b"\r\n") else b"\n"
+                result[-1] = line + eol
+            result.append(correct_run[:-1] + eol)
+
+    if insert_index is not None:
+        changes.append(f"{to_text(section_name)} → ADDED run line: {to_text(correct_run.strip())}")
+
+    return result, changes
+
+
+def read_if_has_section_markers(file_path):
+    # Probe through mmap so files without markers are never read into memory
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+        with mm:
+            if mm.find(b"[CommandList") == -1 and mm.find(b"[TextureOverride") == -1:
+                return None
+            return mm[:]
+
+
+def parse_ini(file_path):
+    # Files without any CommandList/TextureOverride header have nothing to fix
+    raw = read_if_has_section_markers(file_path)
+    if raw is None:
+        return None
+    return raw, raw.splitlines(keepends=True), b"NormalMap" in raw
+
+
+def process_lines(lines, exclude_sections, rename_extra_ps=False, file_has_normal=True):
     new_lines = []
     block_lines = []
     current_section = None
+    inside_excluded = False
     all_changes = []
+    new_lines_append = new_lines.append
+    new_lines_extend = new_lines.extend
+    block_lines_append = block_lines.append
 
     for line in lines:
-        stripped = line.strip()
+        stripped = line.lstrip()
 
-        if stripped.startswith("[CommandList") or stripped.startswith("[TextureOverride"):
+        if stripped.startswith(SECTION_PREFIXES):
             if block_lines:
-                contains_ps_t0 = any(re.match(r'\s*ps-t0\s*=', l, re.IGNORECASE) for l in block_lines)
-                inside_auto_excluded = any(pat.match(current_section.strip()) for pat in AUTO_EXCLUDE_PATTERNS)
-                inside_manual_excluded = current_section.strip() in exclude_sections
-
-                clean_only = inside_auto_excluded or inside_manual_excluded or not contains_ps_t0
-
-                processed, changes = process_block_full(block_lines, current_section, clean_only=clean_only)
-                new_lines.extend(processed)
+                clean_only = not block_has_ps_t0(block_lines)
+                processed, changes = process_block_full(block_lines, current_section, clean_only=clean_only,
+                                                        rename_extra_ps=rename_extra_ps, file_has_normal=file_has_normal)
+                new_lines_extend(processed)
                 all_changes.extend(changes)
                 block_lines.clear()
 
-            current_section = stripped
-            new_lines.append(line)
+            current_section = stripped.rstrip()
+            inside_excluded = current_section in exclude_sections
+            new_lines_append(line)
             continue
 
-        if current_section:
-            block_lines.append(line)
+        if inside_excluded:
+            # Excluded sections only lose their run lines, no need to collect a block for that
+            if is_run_line(stripped):
+                all_changes.append(f"{to_text(current_section)} → REMOVED misplaced run: {to_text(stripped.rstrip())}")
+            else:
+                new_lines_append(line)
+        elif current_section:
+            block_lines_append((line, stripped))
         else:
-            new_lines.append(line)
+            new_lines_append(line)
 
     if block_lines:
-        contains_ps_t0 = any(re.match(r'\s*ps-t0\s*=', l, re.IGNORECASE) for l in block_lines)
-        inside_auto_excluded = any(pat.match(current_section.strip()) for pat in AUTO_EXCLUDE_PATTERNS)
-        inside_manual_excluded = current_section.strip() in exclude_sections
-        clean_only = inside_auto_excluded or inside_manual_excluded or not contains_ps_t0
-        processed, changes = process_block_full(block_lines, current_section, clean_only=clean_only)
-        new_lines.extend(processed)
+        clean_only = not block_has_ps_t0(block_lines)
+        processed, changes = process_block_full(block_lines, current_section, clean_only=clean_only,
+                                                rename_extra_ps=rename_extra_ps, file_has_normal=file_has_normal)
+        new_lines_extend(processed)
         all_changes.extend(changes)
 
     return all_changes, new_lines
 
 
-def main():
-    global rename_extra_ps
+def process_ini_bytes(raw, exclude_sections, rename_extra_ps=False, file_has_normal=True):
+    # Process pool entry point: raw bytes in and out pickle much cheaper than line lists
+    changes, new_lines = process_lines(raw.splitlines(keepends=True), exclude_sections, rename_extra_ps, file_has_normal)
+    return changes, b"".join(new_lines)
+
+
+def find_ini_files(recursive):
+    if not recursive:
+        with os.scandir('.') as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith('.ini'):
+                    yield os.path.join('.', entry.name)
+        return
+
+    for root, dirs, files in os.walk('.', topdown=True):
+        # Prune hidden folders (.git, editor caches...) before os.walk descends into them
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for file in files:
+            if file.lower().endswith('.ini'):
+                yield os.path.join(root, file)
+
+
+def apply_changes(fpath, data):
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    backup_path = f"{fpath}.bak_{timestamp}"
+
+    if os.path.islink(fpath) or os.stat(fpath).st_nlink > 1:
+        # Linked INIs must be updated through the link, so copy the backup and write in place
+        shutil.copyfile(fpath, backup_path)
+        with open(fpath, 'wb') as out:
+            out.write(data)
+        return backup_path
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(fpath) or '.',
+                                    prefix=f"{os.path.basename(fpath)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        # Keep the permissions of the file being replaced
+        shutil.copymode(fpath, tmp_path)
+        # The original becomes the backup by rename, so it is never copied
+        os.replace(fpath, backup_path)
+        os.replace(tmp_path, fpath)
+    except BaseException:
+        # Put the original back if it was already moved to the backup, and drop the temp file
+        if not os.path.exists(fpath) and os.path.exists(backup_path):
+            os.replace(backup_path, fpath)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return backup_path
 
+
+def main():
     while True:
         choice = input(
             'Rename ps-t0 lines containing "Extra" and "Diffuse" to ps-t1 in sections? (y/n): '
@@ -157,43 +238,83 @@ def main():
     recursive = input("Scan subfolders too? (y/n): ").strip().lower() == 'y'
 
     ini_files = []
+    file_raw = {}
+    file_lines = {}
+    file_has_normal = {}
     sections_found = set()
 
-    for root, dirs, files in os.walk('.', topdown=True):
-        if not recursive and root != '.':
+    for path in find_ini_files(recursive):
+        parsed = parse_ini(path)
+        if parsed is None:
             continue
-        for file in files:
-            if file.lower().endswith('.ini'):
-                path = os.path.join(root, file)
-                ini_files.append(path)
-                with open(path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line.startswith("[CommandList") or line.startswith("[TextureOverride"):
-                            sections_found.add(line)
-        if not recursive:
-            break
-
+        raw, lines, has_normal = parsed
+        ini_files.append(path)
+        file_raw[path] = raw
+        file_lines[path] = lines
+        file_has_normal[path] = has_normal
+        for line in lines:
+            line = line.strip()
+            if line.startswith(SECTION_PREFIXES):
+                sections_found.add(line)
+
+    # Auto-exclusion is decided once per unique section and shares the set with manual exclusions
     exclude_sections = set()
+    candidates = []
     for section in sorted(sections_found):
-        if any(pat.match(section) for pat in AUTO_EXCLUDE_PATTERNS):
-            print(f"Auto-excluded {section}")
-            continue
-        choice = input(f"Exclude {section}? (y/n): ").strip().lower()
-        if choice == "y":
+        if AUTO_EXCLUDE_PATTERN.match(section):
+            print(f"Auto-excluded {to_text(section)}")
             exclude_sections.add(section)
+            continue
+        candidates.append(section)
+
+    # Ask for all manual exclusions at once instead of one prompt per section
+    if candidates:
+        print()
+        for i, section in enumerate(candidates, 1):
+            print(f"  {i}. {to_text(section)}")
+        while True:
+            choice = input("Exclude which sections? (e.g. 1,3,5 / a = all / n = none): ").strip().lower()
+            if choice in ('', 'n'):
+                break
+            if choice == 'a':
+                exclude_sections.update(candidates)
+                break
+            try:
+                picked = {int(x) for x in re.split(r'[,\s]+', choice) if x}
+            except ValueError:
+                picked = None
+            if picked and all(1 <= i <= len(candidates) for i in picked):
+                exclude_sections.update(candidates[i - 1] for i in picked)
+                break
+            print(f"Enter numbers 1-{len(candidates)} separated by commas or spaces, 'a' or 'n'.")
+
+    normal_per_file = [file_has_normal[fpath] for fpath in ini_files]
+    # Windows refuses more than 61 pool workers
+    workers = min(os.cpu_count() or 1, 61)
+    # Spawning workers and pickling files only pays off for large folders on multi-core machines,
+    # a single mod stays in-process
+    if workers > 1 and len(ini_files) > 4 * workers:
+        chunksize = max(1, len(ini_files) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(process_ini_bytes, [file_raw[fpath] for fpath in ini_files],
+                                  repeat(exclude_sections), repeat(rename_extra_ps), normal_per_file,
+                                  chunksize=chunksize))
+    else:
+        results = []
+        for fpath, has_normal in zip(ini_files, normal_per_file):
+            changes, new_lines = process_lines(file_lines[fpath], exclude_sections, rename_extra_ps, has_normal)
+            results.append((changes, b"".join(new_lines)))
 
     all_changes = {}
-    for fpath in ini_files:
-        changes, _ = process_ini_preview(fpath, exclude_sections)
+    for fpath, (changes, new_data) in zip(ini_files, results):
         if changes:
-            all_changes[fpath] = changes
+            all_changes[fpath] = (changes, new_data)
 
     if not all_changes:
         print("\nNo changes detected.")
     else:
         print("\n=== Proposed Changes ===")
-        for f, changes in all_changes.items():
+        for f, (changes, _) in all_changes.items():
             print(f"\nFile: {f}")
             for c in changes:
                 if "ADDED" in c:
@@ -206,14 +327,17 @@ def main():
 
         proceed = input("\nApply changes? (y/n): ").strip().lower()
         if proceed == 'y':
-            for fpath in all_changes.keys():
-                _, new_lines = process_ini_preview(fpath, exclude_sections)
-                timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                backup_path = f"{fpath}.bak_{timestamp}"
-                shutil.copyfile(fpath, backup_path)
-                with open(fpath, 'w', encoding='utf-8') as out:
-                    out.writelines(new_lines)
-                print(f"\n✅ Updated: {fpath}\n  Backup: {backup_path}")
+            with ThreadPoolExecutor() as ex:
+                futures = {fpath: ex.submit(apply_changes, fpath, new_data)
+                           for fpath, (_, new_data) in all_changes.items()}
+                # Report every file, a failed write must not hide the ones that did go through
+                for fpath, future in futures.items():
+                    try:
+                        backup_path = future.result()
+                    except Exception as e:
+                        print(f"\n{RED}❌ Failed: {fpath}\n  {e}{RESET}")
+                    else:
+                        print(f"\n✅ Updated: {fpath}\n  Backup: {backup_path}")
             print("\nDone.")
         else:
             print("No changes applied.")
@@ -222,4 +346,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()